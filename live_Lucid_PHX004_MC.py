@@ -2,11 +2,12 @@
 # Author: Moritz Jünnemann
 # Date: 2025.06.05
 from arena_api.system import system
-from arena_api.buffer import *
+from numba import njit, prange
 
-import ctypes
 import numpy as np
 import cv2
+import queue
+import threading
 import time
 import subprocess
 from typing import Tuple, Dict, Any, List
@@ -28,14 +29,40 @@ class Settings:
 
     PATH_FEATURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_features")
 
+    # Optional recording of the display frames as an uncompressed PGM stream
+    # (PNG/zlib encoding is far too slow for the hot loop):
+    RECORD = False
+    PATH_RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+
     # Will be assigned throughout the code:
     TIMESTAMP = None
 
 
+@njit(parallel=True, cache=True)
+def pack_frame(src, dst):
+    """
+    Fused 12->8 bit pack and max reduction in a single pass over the frame.
+    Writes the shifted pixels into the preallocated dst buffer and returns
+    the 16-bit maximum of src, so the frame is only read once.
+    """
+    row_max = np.zeros(src.shape[0], dtype=np.uint16)
+    for i in prange(src.shape[0]):
+        m = np.uint16(0)
+        for j in range(src.shape[1]):
+            v = src[i, j]
+            if v > m:
+                m = v
+            dst[i, j] = np.uint8(v >> 4)
+        row_max[i] = m
+    return row_max.max()
+
+
 ##########################################################################
 # MAIN FUNCTION ########################################################
 ##########################################################################
 def main():
+    raise_process_priority()
+
     devices = create_devices_with_tries_ip()
     device = system.select_device(devices)
 
@@ -51,63 +78,111 @@ def main():
     device.nodemap.write_streamable_node_values_to(file_name=filename)
 
     # setup the device:
-    num_channels, nodes, selected_nodes, initial_settings = setup(device)
+    nodes, selected_nodes, initial_settings = setup(device)
 
     print("\nLIVE ACQUISITION STARTED, press ESC to stop ---------------------\n")
 
     prev_frame_time = time.time()
 
+    # Preallocated buffers, allocated once the frame size is known. The 8-bit
+    # display buffers are ping-ponged because they cross the thread boundary:
+    # without the resize step the queued frame could still be on screen while
+    # the next one is packed into it. The 16-bit frame never leaves the loop,
+    # so a single buffer is enough there.
+    frame_16bit = None
+    display_bufs = None
+    display_idx = 0
+    frame_ctr = 0
+
+    # FPS overlay state: exponentially smoothed rate and a cached text strip
+    fps_ema = 0.0
+    fps_text_cache = None
+    last_text_time = 0.0
+
+    # Display runs in its own thread; capture hands over frames through a
+    # size-1 queue and drops them when the GUI is busy (always show newest):
+    frame_queue = queue.Queue(maxsize=1)
+    stop_event = threading.Event()
+    display_thread = threading.Thread(target=display_worker, args=(frame_queue, stop_event), daemon=True)
+    display_thread.start()
+
+    record_file = None
+    if Settings.RECORD:
+        os.makedirs(Settings.PATH_RECORDINGS, exist_ok=True)
+        record_path = os.path.join(Settings.PATH_RECORDINGS, f"{Settings.TIMESTAMP}_display.pgm")
+        record_file = open(record_path, 'wb')
+        print(f"Recording display frames to {record_path}")
+
     try:
         with device.start_stream():
-            while True:
+            while not stop_event.is_set():
                 curr_frame_time = time.time()
 
                 # Get the buffer:
                 buffer = device.get_buffer()
-                item = BufferFactory.copy(buffer)
-                device.requeue_buffer(buffer)
-
-                # buffer_bytes_per_pixel = int(len(item.data) / (item.width * item.height))
-
-                # convert the buffer to an array
-                array = (ctypes.c_ubyte * num_channels * item.width * item.height).from_address(
-                    ctypes.addressof(item.pbytes))
 
-                # create a numpy array from the buffer
-                npndarray = np.ndarray(buffer=array, dtype=np.uint8,
-                                       shape=(item.height, item.width, Settings.BYTES_PER_PIXEL))
+                if frame_16bit is None:
+                    height, width = buffer.height, buffer.width
+                    frame_16bit = np.empty((height, width), dtype=np.uint16)
+                    display_bufs = [np.empty((height, width), dtype=np.uint8) for _ in range(2)]
 
-                # convert the numpy array to a 16 bit image
-                image_16bit = npndarray.view(np.uint16).reshape(item.height, item.width)
-
-                # Increase the size of the image by repeating pixels for display
-                # Upscale factor (e.g., 4x in each dimension)
-                # Repeat pixels along each axis
-                if Settings.BINNING > 1:
-                    image_16bit = np.repeat(np.repeat(image_16bit, Settings.BINNING, axis=0), Settings.BINNING, axis=1)
-
-                # print the maximum value of the image
-                print(f"Max value of image: {np.max(image_16bit)}")
+                # view the raw bytes as uint16 via the buffer protocol (PEP 3118, zero-copy),
+                # copy once into the preallocated buffer and requeue immediately
+                src = np.frombuffer(memoryview(buffer.pbytes), dtype=np.uint16,
+                                    count=width * height)
+                np.copyto(frame_16bit, src.reshape(height, width))
+                device.requeue_buffer(buffer)
 
-                # Convert to 8-bit for display (assuming 12-bit data: max value 4095)
-                image_display = cv2.convertScaleAbs(image_16bit, alpha=(255.0 / 4095.0))
+                # Fused single pass over the frame: 12->8 bit pack into the
+                # preallocated display buffer plus the max reduction
+                max_value = pack_frame(frame_16bit, display_bufs[display_idx])
 
-                # Display the image with FPS text
-                fps = "fps: " + str(int(1 / (curr_frame_time - prev_frame_time)))
-                cv2.putText(image_display, fps, (7, 35), cv2.FONT_HERSHEY_SIMPLEX, 1, (100, 255, 0), 1, cv2.LINE_AA)
+                # print the maximum value of the image, but only every 30th frame
+                # (the stdout flush is too expensive per frame)
+                if frame_ctr % 30 == 0:
+                    print(f"Max value of image: {max_value}")
+                frame_ctr += 1
 
-                cv2.imshow('Lucid', image_display)
+                image_display = display_bufs[display_idx]
+                display_idx ^= 1
 
-                BufferFactory.destroy(item)
+                # Increase the size of the 8-bit display image to compensate the sensor binning
+                if Settings.BINNING > 1:
+                    image_display = cv2.resize(image_display, None, fx=Settings.BINNING, fy=Settings.BINNING,
+                                               interpolation=cv2.INTER_NEAREST)
+
+                # Smooth the FPS estimate instead of showing the noisy per-frame value
+                dt = curr_frame_time - prev_frame_time
+                if dt > 0:
+                    fps_ema = 0.9 * fps_ema + 0.1 * (1.0 / dt)
+
+                # Re-rasterize the FPS text at most at 5 Hz; every frame only copies
+                # the cached strip instead of calling cv2.putText
+                if fps_text_cache is None or curr_frame_time - last_text_time > 0.2:
+                    fps_text_cache = np.zeros((40, 200), dtype=np.uint8)
+                    cv2.putText(fps_text_cache, f"fps: {int(fps_ema)}", (7, 35),
+                                cv2.FONT_HERSHEY_SIMPLEX, 1, 255, 1, cv2.LINE_AA)
+                    last_text_time = curr_frame_time
+                image_display[:40, :200] = fps_text_cache
+
+                # append the raw frame to the recording (plain bytes, no encoding)
+                if record_file is not None:
+                    record_file.write(b'P5\n%d %d\n255\n' % (image_display.shape[1], image_display.shape[0]))
+                    record_file.write(image_display.tobytes())
+
+                # hand the frame to the display thread, drop it if the GUI is still busy
+                try:
+                    frame_queue.put_nowait(image_display)
+                except queue.Full:
+                    pass
 
                 prev_frame_time = curr_frame_time
 
-                # Check for ESC key to exit
-                key = cv2.waitKey(1)
-                if key == 27:
-                    break
-
     finally:
+        stop_event.set()
+        display_thread.join()
+        if record_file is not None:
+            record_file.close()
         device.stop_stream()
         restore_initial_settings(nodes, selected_nodes, initial_settings)
         cv2.destroyAllWindows()
@@ -115,6 +190,29 @@ def main():
         print(f'Destroyed all created devices')
 
 
+def display_worker(frame_queue: queue.Queue, stop_event: threading.Event) -> None:
+    """
+    Shows frames from the queue in an OpenCV window until ESC is pressed
+    or the stop event is set. Runs in its own thread so the capture loop
+    never blocks on GUI refresh.
+
+    :param frame_queue: Queue the capture loop puts display frames into.
+    :param stop_event: Event used to stop both capture and display.
+    """
+    while not stop_event.is_set():
+        try:
+            image = frame_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+        cv2.imshow('Lucid', image)
+
+        # Check for ESC key to exit
+        key = cv2.waitKey(1)
+        if key == 27:
+            stop_event.set()
+
+
 ################################################################################
 # Camera and System Setup ################################################
 ################################################################################
@@ -128,10 +226,9 @@ def create_devices_with_tries_ip():
     while tries < tries_max:
         devices = system.create_device()
         if not devices:
-            print(f'\tTry {tries + 1} of {tries_max}: Running ping command  twice to check device connection...')
+            print(f'\tTry {tries + 1} of {tries_max}: Running ping command to check device connection...')
 
-            # ping twice:
-            ping_host(Settings.CAMERA_IP)
+            # one ping is enough to force ARP resolution:
             ping_host(Settings.CAMERA_IP)
 
             tries += 1
@@ -147,14 +244,13 @@ def create_devices_with_tries_ip():
                         f'the example again.')
 
 
-def setup(device) -> Tuple[int, Dict[str, Any], List[str], Dict[str, Any]]:
+def setup(device) -> Tuple[Dict[str, Any], List[str], Dict[str, Any]]:
     """
     Setup pixel format, fixed exposure time, frame rate, and stream parameters.
     Also stores and returns original exposure and frame rate settings.
 
     :param: device: The camera device to configure.
     :return:
-        - num_channels: Number of channels in the image.
         - nodes : Dictionary of selected nodes.
         - selected_parameters: List of selected parameters.
         - initial_settings: Dictionary of initial settings.
@@ -169,13 +265,15 @@ def setup(device) -> Tuple[int, Dict[str, Any], List[str], Dict[str, Any]]:
     # get the nodes ONCE: !!!
     nodes = nodemap.get_node(selected_parameters)
 
-    nodes['PixelFormat'].value = Settings.PIXEL_FORMAT
-
     # === Store initial settings ===
+    # single snapshot of all selected nodes BEFORE anything is written, so
+    # restore_initial_settings really restores the pre-run camera state
     initial_settings = {}
     for param in selected_parameters:
         initial_settings[param] = nodes[param].value
 
+    nodes['PixelFormat'].value = Settings.PIXEL_FORMAT
+
     # === Set Acquisition Frame Rate to slightly above the 1/exposure time ===
     print(f"\nCAMERA SETUP: ---------------------------------------------------\n")
     nodes['AcquisitionFrameRateEnable'].value = True
@@ -230,8 +328,16 @@ def setup(device) -> Tuple[int, Dict[str, Any], List[str], Dict[str, Any]]:
     tl_stream_nodemap['StreamAutoNegotiatePacketSize'].value = True
     tl_stream_nodemap['StreamPacketResendEnable'].value = True
 
-    num_channels = 3  # Not used for Mono12 but still required
-    return num_channels, nodes, selected_parameters, initial_settings
+    # Keep the buffer queue shallow so the display can never lag the sensor by
+    # more than a few frames (not every firmware exposes these nodes):
+    try:
+        tl_stream_nodemap['StreamBufferCountMode'].value = 'Manual'
+        tl_stream_nodemap['StreamBufferCountManual'].value = 3
+        print(f"StreamBufferCountManual set to {tl_stream_nodemap['StreamBufferCountManual'].value}")
+    except Exception:
+        print("StreamBufferCount nodes not available, keeping default buffer count")
+
+    return nodes, selected_parameters, initial_settings
 
 
 def restore_initial_settings(nodes: Dict[str, Any], selected_parameters: List[str], initial_settings: Dict[str, Any]) -> None:
@@ -256,13 +362,15 @@ def save_features_to_file(device, filename):
     nodemap = device.nodemap
     features = nodemap.feature_names
 
+    # get the nodes ONCE in a single batch call instead of one lookup per feature
+    nodes = nodemap.get_node(list(features))
+
     # save the features to a file
     with open(filename, 'w') as f:
         for feature in features:
-            node = nodemap.get_node(feature)
             # check if the attribute "value" exists
             try:
-                value = node.value
+                value = nodes[feature].value
             except:
                 value = "N/A"
             f.write(f"{feature}: {value}\n")
@@ -273,16 +381,33 @@ def save_features_to_file(device, filename):
 ############################################################
 # Other functions ########################################
 ############################################################
-def ping_host(ip: str, count: int = 3) -> None:
+def raise_process_priority() -> None:
+    """
+    Raises the scheduling priority of the capture process so competing OS and
+    GUI threads cause less frame-interval jitter. Both steps usually need
+    elevated privileges and are skipped with a notice when unavailable.
+    """
+    try:
+        os.nice(-10)
+    except (AttributeError, OSError):
+        print("Could not raise process niceness (needs elevated privileges)")
+
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(10))
+    except (AttributeError, OSError):
+        print("Could not enable SCHED_FIFO scheduling, keeping default scheduler")
+
+
+def ping_host(ip: str, count: int = 1) -> None:
     """
-    Pings a given IP address and prints the output.
-    Prints when the ping process has finished.
+    Pings a given IP address with a 1 s timeout per packet.
+    Output is suppressed; the ping only serves to force ARP resolution.
 
     :param ip: IP address to ping.
     :param count: Number of ping packets to send.
     """
-    result = subprocess.run(['ping', '-c', str(count), ip])
-    print("Ping process finished with return code:", result.returncode)
+    subprocess.run(['ping', '-c', str(count), '-W', '1', ip],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,11 @@
 # Live Acquisition script for Ocean Optics spectrometer
 # Author: Moritz Jünnemann
 # Date: 2025.06.05
+import threading
+
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.animation import FuncAnimation
 from seabreeze.spectrometers import Spectrometer
 
 
@@ -16,13 +20,13 @@ def main():
     # Get the wavelength axis
     wavelengths = spec.wavelengths()
 
-    # Initial intensities
-    intensities = spec.intensities()
+    # Initial intensities; this array is reused as the plot's ydata buffer for
+    # every spectrum, so the line never needs a new array bound to it
+    ydata = spec.intensities(correct_dark_counts=False, correct_nonlinearity=False)
 
     # Set up the plot
-    plt.ion()  # Turn on interactive mode
     fig, ax = plt.subplots(figsize=(20, 10))  # Set figure size here
-    line, = ax.plot(wavelengths, intensities, linewidth=2)
+    line, = ax.plot(wavelengths, ydata, linewidth=2)
     ax.set_xlabel("Wavelength (nm)", fontsize=24)
     ax.set_ylabel("Intensity", fontsize=24)
     ax.set_title("Live Spectrum", fontsize=24)
@@ -34,20 +38,38 @@ def main():
     ax.set_xlim(wavelengths[0], wavelengths[-1])
     # set a grid:
     ax.grid()
-    fig.canvas.draw()
-    fig.show()
+
+    # Acquisition runs in a background thread (seabreeze releases the GIL during
+    # the read) and writes each new spectrum into the shared ydata buffer.
+    # The buffer is not locked, so a redraw can catch a spectrum mid-copy;
+    # a single torn frame is acceptable for a live view and avoids blocking
+    # either thread.
+    alive = threading.Event()
+    alive.set()
+
+    def acquire():
+        while alive.is_set():
+            np.copyto(ydata, spec.intensities(correct_dark_counts=False, correct_nonlinearity=False))
+
+    acq_thread = threading.Thread(target=acquire, daemon=True)
+    acq_thread.start()
+
+    # Redraws run at a fixed 20 ms cadence, decoupled from the sample rate
+    def update(_):
+        # set_ydata is needed even though the array is the same object: it sets
+        # the stale flag, otherwise Line2D keeps blitting its cached vertices
+        line.set_ydata(ydata)
+        return (line,)
+
+    ani = FuncAnimation(fig, update, interval=20, blit=True, cache_frame_data=False)
 
     try:
-        while True:
-            # Get new spectrum (blocks until ready)
-            intensities = spec.intensities()
-
-            # Update plot
-            line.set_ydata(intensities)
-            fig.canvas.draw()
-            fig.canvas.flush_events()
+        plt.show()
     except KeyboardInterrupt:
         print("Stopped by user")
+    finally:
+        alive.clear()
+        acq_thread.join()
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@
 # Date: 2025.06.05
 # THIS SCRIPT REQUIRES A HARDWARE TRIGGER CONNECTED TO AND TRIGGERING THE CAMERA!!!
 import numpy as np
+import os
 import time
 import matplotlib.pyplot as plt
 from pylablib.devices import PrincetonInstruments
@@ -14,6 +15,7 @@ class Settings:
     BINNING = (1, 400)
     SPECTRA_SHAPE = (1, 1340)
     REFRESH_TIME_S = 0.1
+    RESCALE_EVERY = 20  # full redraw (with autoscale) only every N frames, blit otherwise
     ENERGY_FILE = r"C:\Users\Moritz\Desktop\Pixis_data\Spec.txt"
 
 
@@ -21,8 +23,7 @@ class Settings:
 def main():
     # Load energy axis from file
     try:
-        with open(Settings.ENERGY_FILE, "r") as f:
-            energy_eV = np.loadtxt(f)
+        energy_eV = load_energy_axis(Settings.ENERGY_FILE)
     except Exception as e:
         print(f"Failed to load energy axis from file: {e}")
         return
@@ -48,7 +49,9 @@ def main():
 
     time.sleep(0.2)
 
-    cam.setup_acquisition(mode="sequence", nframes=1000)
+    # shallow circular buffer: a deep queue only lets stale frames pile up
+    # when the display falls behind the trigger
+    cam.setup_acquisition(mode="sequence", nframes=4)
     cam.start_acquisition()
 
     print("Starting live display... (Press Ctrl+C to stop)")
@@ -58,12 +61,20 @@ def main():
     fig, ax = plt.subplots()
     y = np.zeros_like(energy_eV)
     line, = ax.plot(energy_eV, y)
+    # animated: full draws leave the line out, so the cached blit background
+    # never contains an old trace that would ghost behind the live one
+    line.set_animated(True)
     ax.set_title("Live XUV Spectrum")
     ax.set_xlabel("Energy (eV)")
     ax.set_ylabel("Counts")
     fig.canvas.draw()
     fig.canvas.flush_events()
 
+    # Cache the static axes background for blitting
+    background = fig.canvas.copy_from_bbox(ax.bbox)
+    frame_ctr = 0
+    next_update = time.monotonic()
+
     try:
         while True:
             data = cam.read_newest_image()
@@ -72,7 +83,8 @@ def main():
                 time.sleep(Settings.EXP_TIME_MS / 1000 / 10)
                 continue
 
-            spectrum = data.ravel().astype(np.uint16)
+            # ravel() is a view for contiguous data; only convert if the dtype is off
+            spectrum = data.ravel() if data.dtype == np.uint16 else data.ravel().astype(np.uint16, copy=False)
 
             if spectrum.shape[0] != energy_eV.shape[0]:
                 print(f"Unexpected spectrum shape: {spectrum.shape}")
@@ -81,11 +93,31 @@ def main():
             # Update plot
             try:
                 line.set_ydata(spectrum)
-                ax.relim()
-                ax.autoscale_view()
-                fig.canvas.draw()
+                if frame_ctr % Settings.RESCALE_EVERY == 0:
+                    # autoscaling invalidates the cached background -> full redraw and re-cache
+                    ax.relim()
+                    ax.autoscale_view()
+                    fig.canvas.draw()
+                    background = fig.canvas.copy_from_bbox(ax.bbox)
+                    # draw() skips the animated line, so blit it on top here too
+                    ax.draw_artist(line)
+                    fig.canvas.blit(ax.bbox)
+                else:
+                    # cheap path: blit only the line onto the cached background
+                    fig.canvas.restore_region(background)
+                    ax.draw_artist(line)
+                    fig.canvas.blit(ax.bbox)
+                frame_ctr += 1
                 fig.canvas.flush_events()
-                time.sleep(Settings.REFRESH_TIME_S)
+
+                # Rate regulator: sleep only up to the next refresh deadline instead
+                # of an unconditional sleep, so queued frames are never left waiting
+                next_update += Settings.REFRESH_TIME_S
+                delay = next_update - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_update = time.monotonic()
             except Exception as e:
                 print(f"Plot update error: {e}")
                 continue
@@ -103,6 +135,23 @@ def main():
         plt.show()
 
 
+# HELPER FUNCTIONS ############################################################
+def load_energy_axis(txt_path):
+    """
+    Loads the energy axis, caching the parsed text file as .npy next to it.
+    Later runs load the binary cache directly, which skips the text parsing;
+    the cache is refreshed whenever the text file is newer.
+    """
+    npy_path = os.path.splitext(txt_path)[0] + ".npy"
+
+    if os.path.exists(npy_path) and os.path.getmtime(npy_path) >= os.path.getmtime(txt_path):
+        return np.load(npy_path, mmap_mode="r")
+
+    energy_eV = np.loadtxt(txt_path)
+    np.save(npy_path, energy_eV)
+    return energy_eV
+
+
 # RUN SCRIPT ##################################################################
 if __name__ == "__main__":
     main()